@@ -2,7 +2,42 @@
 
 import logging
 import sys
-from pythonjsonlogger import jsonlogger
+from datetime import datetime, timezone
+
+import orjson
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class FastJsonFormatter(logging.Formatter):
+    """Format log records as single-line JSON objects.
+    
+    Emits timestamp, name, levelname and message, plus any fields passed via
+    `extra` as top-level keys. Values orjson cannot encode are logged as str.
+    """
+    
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as JSON.
+        
+        Args:
+            record: Log record to format
+            
+        Returns:
+            JSON-encoded log line
+        """
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc),
+            "name": record.name,
+            "levelname": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
 
 
 def setup_logging(log_level: str = "INFO") -> None:
@@ -12,10 +47,7 @@ def setup_logging(log_level: str = "INFO") -> None:
         log_level: Logging level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
     """
     # Create JSON formatter
-    formatter = jsonlogger.JsonFormatter(
-        '%(asctime)s %(name)s %(levelname)s %(message)s',
-        timestamp=True
-    )
+    formatter = FastJsonFormatter()
     
     # Configure root logger
     root_logger = logging.getLogger()
@@ -1,15 +1,17 @@
 """Main FastAPI application for HTTP server coding challenge."""
 
+import asyncio
+import contextlib
 import logging
 import os
 from contextlib import asynccontextmanager
 from typing import List
 
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response, status
+from fastapi.responses import ORJSONResponse
 
 from app.logging_config import setup_logging
-from app.models import TreeNode, CreateNodeRequest, CreateNodeResponse
+from app.models import TreeNode, BatchCreateRequest, CreateNodeRequest, CreateNodeResponse
 from app.storage import create_storage_backend, StorageBackend, StorageError
 from app.tree_manager import TreeManager
 
@@ -20,12 +22,22 @@ logger = logging.getLogger(__name__)
 # Global state
 storage: StorageBackend = None
 tree_manager: TreeManager = None
+dirty_event: asyncio.Event = asyncio.Event()  # Set when state needs a full save
+create_lock: asyncio.Lock = asyncio.Lock()  # Serializes tree mutations and saves
+stop_event: asyncio.Event = asyncio.Event()  # Set on shutdown to stop the flusher
+# Prefixes ETags: versions not yet flushed when the process dies are handed
+# out again after a restart, with different content
+BOOT_ID = os.urandom(4).hex()
+
+# Retry delays for failed background saves, doubling up to the cap
+FLUSH_RETRY_MIN_SECONDS = 0.1
+FLUSH_RETRY_MAX_SECONDS = 30.0
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle - startup and shutdown."""
-    global storage, tree_manager
+    global storage, tree_manager, dirty_event, create_lock, stop_event
     
     # Startup
     logger.info("Starting Tree API server")
@@ -39,10 +51,26 @@ async def lifespan(app: FastAPI):
         
         # Initialize tree manager and load data
         tree_manager = TreeManager()
-        data = storage.load()
+        data = await asyncio.to_thread(storage.load)
         tree_manager.load_state(data)
         logger.info("Tree manager initialized and data loaded")
         
+        # Fold a long journal into the snapshot before serving, so it is
+        # not replayed again on the next restart
+        if storage.needs_compaction(startup=True):
+            try:
+                await asyncio.to_thread(storage.save_chunks, tree_manager.get_state_chunks(), tree_manager.next_id)
+                logger.info("Compacted journal on startup")
+            except StorageError as e:
+                logger.error(f"Failed to compact journal on startup: {e}", exc_info=True)
+        
+        # Start background flusher
+        dirty_event = asyncio.Event()
+        create_lock = asyncio.Lock()
+        stop_event = asyncio.Event()
+        flush_interval = int(os.getenv("FLUSH_INTERVAL_MS", "50")) / 1000
+        flush_task = asyncio.create_task(_flush_periodically(flush_interval))
+        
     except Exception as e:
         logger.error(f"Failed to initialize application: {e}", exc_info=True)
         raise
@@ -51,6 +79,81 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Tree API server")
+    # Let a save in progress finish rather than cancelling it part way
+    stop_event.set()
+    await flush_task
+    if dirty_event.is_set():
+        await _flush()
+    await asyncio.to_thread(storage.close)
+
+
+async def _flush_periodically(interval: float) -> None:
+    """Save dirty state in the background, coalescing creates within an interval.
+    
+    After a failed save the wait before the next attempt doubles, up to
+    FLUSH_RETRY_MAX_SECONDS, so a failing backend is not retried (and
+    logged) on every interval. Returns once stop_event is set, after any
+    save in progress; the final save is left to shutdown.
+    
+    Args:
+        interval: Seconds to wait after the state is marked dirty before saving
+    """
+    delay = interval
+    while True:
+        await _wait_first(dirty_event, stop_event)
+        await _wait_unless_stopped(delay)
+        if stop_event.is_set():
+            return
+        if await _flush():
+            delay = interval
+        else:
+            delay = min(max(delay * 2, FLUSH_RETRY_MIN_SECONDS), FLUSH_RETRY_MAX_SECONDS)
+
+
+async def _wait_unless_stopped(delay: float) -> None:
+    """Wait for delay seconds, returning early once stop_event is set.
+    
+    Args:
+        delay: Seconds to wait
+    """
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(stop_event.wait(), delay)
+
+
+async def _wait_first(*events: asyncio.Event) -> None:
+    """Wait until any of the given events is set.
+    
+    Args:
+        events: Events to wait on
+    """
+    waiters = [asyncio.create_task(event.wait()) for event in events]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+
+async def _flush() -> bool:
+    """Save the full tree state, re-marking it dirty if the save fails.
+    
+    The state is captured under create_lock, but written outside it so
+    creates are not held up by storage latency. Ops journaled during the
+    write have ids at or above the captured next_id and are kept.
+    
+    Returns:
+        True if the state was saved, False otherwise
+    """
+    dirty_event.clear()
+    try:
+        async with create_lock:
+            chunks, next_id = tree_manager.get_state_chunks(), tree_manager.next_id
+        await asyncio.to_thread(storage.save_chunks, chunks, next_id)
+    except StorageError as e:
+        logger.error(f"Failed to persist data: {e}", exc_info=True)
+        dirty_event.set()
+        return False
+    return True
 
 
 def _get_storage_config(storage_type: str) -> dict:
@@ -83,7 +186,8 @@ app = FastAPI(
     title="HTTP Server Coding Challenge",
     description="Production-ready HTTP API for managing hierarchical tree data structures",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 
@@ -94,11 +198,11 @@ async def health_check():
     Returns:
         Health status with storage connectivity check
     """
-    storage_healthy = storage.health_check() if storage else False
+    storage_healthy = await asyncio.to_thread(storage.health_check) if storage else False
     
     if not storage_healthy:
         logger.warning("Health check failed: storage not accessible")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             content={
                 "status": "unhealthy",
@@ -112,17 +216,32 @@ async def health_check():
     }
 
 
-@app.get("/api/tree", response_model=List[TreeNode], status_code=status.HTTP_200_OK)
-async def get_trees():
+@app.get(
+    "/api/tree",
+    response_class=ORJSONResponse,
+    responses={status.HTTP_200_OK: {"model": List[TreeNode]}},
+    status_code=status.HTTP_200_OK
+)
+async def get_trees(request: Request):
     """Get all trees from the database.
     
+    The body is serialized once per tree version and tagged with it (and
+    BOOT_ID) as an ETag; requests carrying a matching If-None-Match get a 304.
+    
+    Args:
+        request: Incoming request, checked for If-None-Match
+    
     Returns:
         List of all root trees with their hierarchical structure
     """
     try:
-        trees = tree_manager.get_all_trees()
-        logger.info(f"Retrieved {len(trees)} trees")
-        return trees
+        etag = f'"{BOOT_ID}-{tree_manager.version}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        
+        body = tree_manager.get_trees_bytes()
+        logger.debug("Retrieved trees", extra={"version": tree_manager.version})
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
     except Exception as e:
         logger.error(f"Failed to retrieve trees: {e}", exc_info=True)
         raise HTTPException(
@@ -145,28 +264,46 @@ async def create_node(request: CreateNodeRequest):
         HTTPException: If parent not found or storage fails
     """
     try:
-        # Create the node
-        new_node = tree_manager.create_node(request.label, request.parent_id)
-        
-        # Persist to storage
-        try:
-            storage.save(tree_manager.get_state())
-        except StorageError as e:
-            logger.error(f"Failed to persist data: {e}", exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to save data to storage"
-            )
+        async with create_lock:
+            # Refuse creates that could never be persisted
+            if not storage.is_writable():
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Storage is not accepting writes"
+                )
+            
+            # Create the node
+            new_node = tree_manager.create_node(request.label, request.parent_id)
+            
+            # Persist to storage: journal the op, leaving a full save to the
+            # background flusher for backends without a journal or when the
+            # journal needs compacting. The append is a single unbuffered
+            # local write, so it stays on the event loop.
+            op = {"op": "create", "id": new_node["id"], "label": new_node["label"], "parent_id": request.parent_id}
+            try:
+                if not storage.save_op(op) or storage.needs_compaction():
+                    dirty_event.set()
+            except StorageError as e:
+                # Undo the create, so no later op can reference a node
+                # that was never journaled
+                logger.error(f"Failed to persist data: {e}", exc_info=True)
+                tree_manager.discard_nodes(new_node["id"])
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to save data to storage"
+                )
         
         return CreateNodeResponse(
-            id=new_node.id,
-            label=new_node.label,
+            id=new_node["id"],
+            label=new_node["label"],
             parent_id=request.parent_id
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
         # Parent not found
-        logger.warning(f"Invalid request: {e}")
+        logger.warning("Invalid request: %s", e)
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
@@ -178,3 +315,69 @@ async def create_node(request: CreateNodeRequest):
             detail="Failed to create node"
         )
 
+
+@app.post("/api/tree/batch", response_model=List[CreateNodeResponse], status_code=status.HTTP_201_CREATED)
+async def create_nodes(request: BatchCreateRequest):
+    """Create several nodes in one request with a single storage write.
+    
+    A node may reference a parent created earlier in the same batch. The
+    batch is all or nothing: if any parent is missing, no node is created.
+    
+    Args:
+        request: Ordered list of node creation requests
+        
+    Returns:
+        Information about the newly created nodes, in order
+        
+    Raises:
+        HTTPException: If a parent is not found or storage fails
+    """
+    try:
+        async with create_lock:
+            # Refuse creates that could never be persisted
+            if not storage.is_writable():
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Storage is not accepting writes"
+                )
+            
+            new_nodes = tree_manager.create_nodes([(op.label, op.parent_id) for op in request.ops])
+            
+            # Persist to storage: one journal append for the whole batch
+            ops = [
+                {"op": "create", "id": node["id"], "label": node["label"], "parent_id": op.parent_id}
+                for node, op in zip(new_nodes, request.ops)
+            ]
+            try:
+                if not storage.save_ops(ops) or storage.needs_compaction():
+                    dirty_event.set()
+            except StorageError as e:
+                # Undo the creates, so no later op can reference a node
+                # that was never journaled
+                logger.error(f"Failed to persist data: {e}", exc_info=True)
+                tree_manager.discard_nodes(new_nodes[0]["id"])
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to save data to storage"
+                )
+        
+        return [
+            CreateNodeResponse(id=node["id"], label=node["label"], parent_id=op.parent_id)
+            for node, op in zip(new_nodes, request.ops)
+        ]
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # Parent not found
+        logger.warning("Invalid request: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Failed to create nodes: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create nodes"
+        )
@@ -42,6 +42,22 @@ class CreateNodeRequest(BaseModel):
         }
 
 
+class BatchCreateRequest(BaseModel):
+    """Request model for creating several nodes in one call."""
+    
+    ops: List[CreateNodeRequest] = Field(..., description="Nodes to create, in order", min_length=1)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ops": [
+                    {"label": "new_root", "parent_id": None},
+                    {"label": "new_child", "parent_id": 1}
+                ]
+            }
+        }
+
+
 class CreateNodeResponse(BaseModel):
     """Response model for node creation."""
     
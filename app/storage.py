@@ -1,14 +1,25 @@
 """Storage abstraction layer supporting local filesystem, GCS, and S3."""
 
-import json
+import contextlib
 import logging
+import mmap
 import os
+import threading
+import time
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Sequence
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Snapshots are written compact; set PRETTY_JSON=true to indent them for debugging
+SNAPSHOT_DUMPS_OPTION = orjson.OPT_INDENT_2 if os.getenv("PRETTY_JSON", "").lower() in ("1", "true", "yes") else 0
+
+# Cloud health checks cost a bucket round trip; a success is reused for this many seconds
+HEALTH_CHECK_TTL = float(os.getenv("HEALTH_CHECK_TTL", "30"))
+
 
 class StorageBackend(ABC):
     """Abstract base class for storage backends."""
@@ -37,6 +48,94 @@ class StorageBackend(ABC):
         """
         pass
     
+    def save_bytes(self, payload: bytes) -> None:
+        """Save pre-serialized data to storage.
+        
+        The payload must reflect every op journaled so far, since backends
+        with a journal clear it once the payload is stored.
+        
+        Args:
+            payload: JSON-encoded dictionary containing tree data
+            
+        Raises:
+            StorageError: If saving fails
+        """
+        self.save(orjson.loads(payload))
+    
+    def save_chunks(self, chunks: Sequence[bytes], next_id: Optional[int] = None) -> None:
+        """Save pre-serialized data given as consecutive pieces.
+        
+        Backends that write to a file can stream the pieces without
+        joining them into a single payload first.
+        
+        Args:
+            chunks: Pieces of the JSON-encoded dictionary, in order
+            next_id: next_id of the encoded state. Journaled ops at or above
+                it were appended after the state was captured and are kept;
+                None means the state covers every journaled op.
+            
+        Raises:
+            StorageError: If saving fails
+        """
+        self.save_bytes(b"".join(chunks))
+    
+    def save_op(self, op: Dict[str, Any]) -> bool:
+        """Append a single mutation to the backend's journal.
+        
+        Backends without a journal return False, in which case the caller
+        must persist the full state with save().
+        
+        Args:
+            op: Mutation record, e.g. {"op": "create", "id": 1, "label": "root", "parent_id": None}
+            
+        Returns:
+            True if the op was journaled, False otherwise
+            
+        Raises:
+            StorageError: If appending fails
+        """
+        return self.save_ops([op])
+    
+    def save_ops(self, ops: List[Dict[str, Any]]) -> bool:
+        """Append several mutations to the backend's journal in one write.
+        
+        Args:
+            ops: Mutation records, in order
+            
+        Returns:
+            True if the ops were journaled, False otherwise
+            
+        Raises:
+            StorageError: If appending fails
+        """
+        return False
+    
+    def needs_compaction(self, startup: bool = False) -> bool:
+        """Check if the journal has outgrown the snapshot and should be folded into it.
+        
+        Args:
+            startup: Apply the stricter limit used right after load(), when
+                a full save also spares the next restart from replaying
+        
+        Returns:
+            True if the caller should persist the full state with save()
+        """
+        return False
+    
+    def is_writable(self) -> bool:
+        """Check if the backend can still persist writes.
+        
+        Returns:
+            False once the backend has hit an unrecoverable write error;
+            callers should reject mutations rather than keep ones that can
+            never be stored
+        """
+        return True
+    
+    def close(self) -> None:
+        """Flush pending writes to durable storage and release resources."""
+        pass
+    
     @abstractmethod
     def health_check(self) -> bool:
         """Check if storage backend is accessible.
@@ -47,55 +146,419 @@ class StorageBackend(ABC):
         pass
 
 
+def _write_all(fd: int, data) -> None:
+    """Write all of data to a file descriptor, retrying short writes.
+    
+    Args:
+        fd: Open file descriptor
+        data: Bytes-like object to write
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _snapshot_payload(payload: bytes) -> bytes:
+    """Apply SNAPSHOT_DUMPS_OPTION to a compact pre-serialized payload."""
+    if SNAPSHOT_DUMPS_OPTION:
+        return orjson.dumps(orjson.loads(payload), option=SNAPSHOT_DUMPS_OPTION)
+    return payload
+
+
 class StorageError(Exception):
     """Exception raised for storage-related errors."""
     pass
 
 
+# Cloud SDK clients own connection pools and are safe to share, so they are
+# created once per process instead of once per backend instance
+_gcs_client = None
+_boto3_session = None
+
+
+def _get_gcs_client():
+    """Get the process-wide GCS client, creating it on first use."""
+    global _gcs_client
+    if _gcs_client is None:
+        from google.cloud import storage
+        _gcs_client = storage.Client()
+    return _gcs_client
+
+
+def _get_boto3_session():
+    """Get the process-wide boto3 session, creating it on first use."""
+    global _boto3_session
+    if _boto3_session is None:
+        import boto3
+        _boto3_session = boto3.session.Session()
+    return _boto3_session
+
+
 class LocalFileStorage(StorageBackend):
-    """Local filesystem storage backend."""
+    """Local filesystem storage backend.
+    
+    Mutations are appended to a JSON-lines journal next to the snapshot file
+    (trees.json -> trees.jsonl) and folded back into the snapshot by save().
+    """
+    
+    # Journal may grow to this multiple of the snapshot size before compaction
+    COMPACTION_RATIO = 10
+    # Never ask for compaction below this journal size
+    COMPACTION_MIN_BYTES = 1 << 20
+    # On startup, compact once the journal passes this fraction of the snapshot
+    STARTUP_COMPACTION_RATIO = 0.5
+    # Snapshots at least this large are parsed from a memory map
+    MMAP_MIN_BYTES = 64 << 10
+    # Snapshot compression, used when the file name ends in .zst
+    ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+    ZSTD_LEVEL = 3
     
     def __init__(self, file_path: str = "data/trees.json"):
         """Initialize local file storage.
         
         Args:
-            file_path: Path to the JSON file for storage
+            file_path: Path to the JSON file for storage; a .mpk suffix
+                stores the snapshot as MessagePack and a final .zst suffix
+                stores it zstd-compressed (e.g. trees.mpk.zst)
         """
         self.file_path = Path(file_path)
+        self.compress = self.file_path.suffix == ".zst"
+        self.msgpack = ".mpk" in self.file_path.suffixes
         self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.file_path.with_suffix('.jsonl')
+        # Plain strings for the save path, so saves skip Path operations
+        self._path_str = str(self.file_path)
+        self._temp_str = str(self.file_path.with_suffix('.tmp'))
+        self._dir_str = str(self.file_path.parent)
+        self._journal_str = str(self.journal_path)
+        self._journal_temp_str = self._journal_str + ".tmp"
+        # _lock guards the journal handle and is held only for appends and
+        # the final swap of a compacted journal, never across an fsync, so
+        # appends on the event loop are not held up by snapshot writes.
+        # _snapshot_lock serializes snapshot writers.
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        # Write snapshots to an unnamed O_TMPFILE inode where supported;
+        # linking it in needs /proc
+        self._use_tmpfile = hasattr(os, "O_TMPFILE") and os.path.isdir("/proc/self/fd")
+        # Windows cannot open a directory to fsync it
+        self._fsync_dirs = os.name != "nt"
+        self._journal = open(self.journal_path, 'ab', buffering=0)
+        self._journal_bytes = self._journal.tell()
+        # Uncompressed snapshot size; corrected by load() for .zst files
+        self._snapshot_bytes = self.file_path.stat().st_size if self.file_path.exists() else 0
         logger.info(f"Initialized LocalFileStorage: {self.file_path}")
     
     def load(self) -> Dict[str, Any]:
-        """Load data from local file."""
+        """Load data from local file, including any journaled ops not yet in the snapshot."""
         try:
             if not self.file_path.exists():
                 logger.info("No existing data file, starting fresh")
-                return {"trees": [], "next_id": 1}
+                data = {"trees": [], "next_id": 1}
+            else:
+                data = self._read_snapshot()
+                logger.info("Loaded data", extra={"path": str(self.file_path)})
             
-            with open(self.file_path, 'r') as f:
-                data = json.load(f)
-            logger.info(f"Loaded data from {self.file_path}")
+            ops = self._read_journal()
+            if ops:
+                data["journal"] = ops
+                logger.info("Loaded journaled ops", extra={"path": str(self.journal_path), "ops": len(ops)})
             return data
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in {self.file_path}: {e}")
             raise StorageError(f"Corrupted data file: {e}")
+        except StorageError as e:
+            logger.error(f"Failed to load from {self.file_path}: {e}")
+            raise
         except Exception as e:
             logger.error(f"Failed to load from {self.file_path}: {e}")
             raise StorageError(f"Failed to load data: {e}")
     
     def save(self, data: Dict[str, Any]) -> None:
-        """Save data to local file with atomic write."""
-        try:
-            # Atomic write: write to temp file, then rename
-            temp_path = self.file_path.with_suffix('.tmp')
-            with open(temp_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            temp_path.replace(self.file_path)
-            logger.info(f"Saved data to {self.file_path}")
+        """Save data to local file with atomic write and compact the journal."""
+        try:
+            self._write_snapshot([self._encode_snapshot(data)], data.get("next_id", 1))
+            logger.debug("Saved data", extra={"path": self._path_str, "bytes": self._snapshot_bytes})
+        except Exception as e:
+            logger.error(f"Failed to save to {self.file_path}: {e}")
+            raise StorageError(f"Failed to save data: {e}")
+    
+    def save_bytes(self, payload: bytes) -> None:
+        """Save pre-serialized data to local file and clear the journal."""
+        try:
+            self._write_snapshot([self._encode_payload(payload)])
+            logger.debug("Saved data", extra={"path": self._path_str, "bytes": self._snapshot_bytes})
+        except Exception as e:
+            logger.error(f"Failed to save to {self.file_path}: {e}")
+            raise StorageError(f"Failed to save data: {e}")
+    
+    def save_chunks(self, chunks: Sequence[bytes], next_id: Optional[int] = None) -> None:
+        """Stream pre-serialized pieces to local file and compact the journal."""
+        try:
+            if SNAPSHOT_DUMPS_OPTION or self.msgpack:
+                # Re-indenting or re-encoding needs the whole document
+                chunks = [self._encode_payload(b"".join(chunks))]
+            self._write_snapshot(chunks, next_id)
+            logger.debug("Saved data", extra={"path": self._path_str, "bytes": self._snapshot_bytes})
         except Exception as e:
             logger.error(f"Failed to save to {self.file_path}: {e}")
             raise StorageError(f"Failed to save data: {e}")
     
+    def save_ops(self, ops: List[Dict[str, Any]]) -> bool:
+        """Append ops to the journal in a single write."""
+        try:
+            payload = b"".join(orjson.dumps(op) + b"\n" for op in ops)
+            with self._lock:
+                self._write_journal(payload)
+                self._journal_bytes += len(payload)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to append to {self.journal_path}: {e}")
+            raise StorageError(f"Failed to save data: {e}")
+    
+    def needs_compaction(self, startup: bool = False) -> bool:
+        """Check if the journal has outgrown the snapshot."""
+        if startup:
+            return self._journal_bytes > self.STARTUP_COMPACTION_RATIO * self._snapshot_bytes
+        limit = max(self.COMPACTION_RATIO * self._snapshot_bytes, self.COMPACTION_MIN_BYTES)
+        return self._journal_bytes > limit
+    
+    def close(self) -> None:
+        """Fsync and close the journal."""
+        with self._lock:
+            if self._journal.closed:
+                return
+            os.fsync(self._journal.fileno())
+            self._journal.close()
+        logger.info(f"Closed journal: {self.journal_path}")
+    
+    def _write_snapshot(self, chunks: Sequence[bytes], next_id: Optional[int] = None) -> None:
+        """Atomically replace the snapshot and compact the journal.
+        
+        Args:
+            chunks: Encoded snapshot, in one or more consecutive pieces
+            next_id: next_id of the snapshot; journaled ops at or above it are
+                kept. None clears the whole journal.
+        """
+        with self._snapshot_lock:
+            # Compaction compares the journal against the uncompressed size
+            size = sum(len(chunk) for chunk in chunks)
+            # Atomic write: write and fsync a temp file, rename it over
+            # the snapshot, then fsync the directory so the rename sticks
+            if self.compress:
+                chunks = self._compress_chunks(chunks)
+            fd, named = self._open_temp()
+            try:
+                # Write straight from each piece, no file object buffering
+                for chunk in chunks:
+                    _write_all(fd, chunk)
+                os.fsync(fd)
+                if not named:
+                    # Only a complete, synced file ever gets a name
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(self._temp_str)
+                    self._link_fd(fd)
+            finally:
+                os.close(fd)
+            os.replace(self._temp_str, self._path_str)
+            self._fsync_dir()
+            self._snapshot_bytes = size
+            self._compact_journal(next_id)
+    
+    def _open_temp(self):
+        """Open a new file for writing a snapshot.
+        
+        Prefers an unnamed O_TMPFILE inode, so an interrupted write leaves
+        nothing behind, and falls back to creating the .tmp file directly.
+        
+        Returns:
+            (fd, named): the open descriptor, and whether it already has a path
+        """
+        if self._use_tmpfile:
+            try:
+                return os.open(self._dir_str, os.O_TMPFILE | os.O_WRONLY, 0o644), False
+            except OSError as e:
+                logger.info(f"O_TMPFILE unsupported for {self._dir_str}, using named temp files: {e}")
+                self._use_tmpfile = False
+        return os.open(self._temp_str, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), True
+    
+    def _link_fd(self, fd: int) -> None:
+        """Give an O_TMPFILE inode the .tmp file's name.
+        
+        os.link only follows the /proc/self/fd symlink (linkat with
+        AT_SYMLINK_FOLLOW) when given a directory fd.
+        
+        Args:
+            fd: Open O_TMPFILE descriptor
+        """
+        dir_fd = os.open(self._dir_str, os.O_RDONLY)
+        try:
+            os.link(f"/proc/self/fd/{fd}", os.path.basename(self._temp_str), dst_dir_fd=dir_fd, follow_symlinks=True)
+        finally:
+            os.close(dir_fd)
+    
+    def _read_snapshot(self) -> Dict[str, Any]:
+        """Parse the snapshot file.
+        
+        Large snapshots are parsed straight from a read-only memory map
+        rather than copied into a bytes object first.
+        """
+        with open(self.file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < self.MMAP_MIN_BYTES:
+                return self._parse_snapshot(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return self._parse_snapshot(view)
+    
+    def _parse_snapshot(self, raw) -> Dict[str, Any]:
+        """Decode snapshot contents, decompressing them if they are zstd frames.
+        
+        Compression is detected from the content rather than the file name,
+        so either kind of snapshot loads whatever the configured path.
+        
+        Args:
+            raw: Snapshot file contents (bytes or memoryview)
+        """
+        if raw[:4] == self.ZSTD_MAGIC:
+            import zstandard
+            try:
+                raw = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+            except zstandard.ZstdError as e:
+                raise StorageError(f"Corrupted data file: {e}")
+        self._snapshot_bytes = len(raw)
+        if self.msgpack:
+            import msgpack
+            try:
+                return msgpack.unpackb(raw)
+            except (ValueError, msgpack.UnpackException) as e:
+                raise StorageError(f"Corrupted data file: {e}")
+        return orjson.loads(raw)
+    
+    def _encode_payload(self, payload: bytes) -> bytes:
+        """Convert a compact JSON payload to the configured snapshot format.
+        
+        Args:
+            payload: JSON-encoded dictionary containing tree data
+        """
+        if self.msgpack:
+            return self._encode_snapshot(orjson.loads(payload))
+        return _snapshot_payload(payload)
+    
+    def _encode_snapshot(self, data: Dict[str, Any]) -> bytes:
+        """Encode a snapshot in the configured format.
+        
+        Args:
+            data: Dictionary containing tree data
+        """
+        if self.msgpack:
+            import msgpack
+            return msgpack.packb(data)
+        return orjson.dumps(data, option=SNAPSHOT_DUMPS_OPTION)
+    
+    def _compress_chunks(self, chunks: Sequence[bytes]):
+        """Compress snapshot pieces into one zstd frame, piece by piece.
+        
+        Args:
+            chunks: Encoded snapshot pieces, in order
+        
+        Yields:
+            Compressed pieces, in order
+        """
+        import zstandard
+        compressor = zstandard.ZstdCompressor(level=self.ZSTD_LEVEL).compressobj()
+        for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+    
+    def _fsync_dir(self) -> None:
+        """Fsync the snapshot's directory to persist renames within it.
+        
+        Skipped on Windows, where directories cannot be opened and NTFS
+        journals the rename itself.
+        """
+        if not self._fsync_dirs:
+            return
+        dir_fd = os.open(self._dir_str, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """Read all complete ops from the journal.
+        
+        A trailing line without a newline is the remains of an interrupted
+        append and is ignored.
+        """
+        if not self.journal_path.exists():
+            return []
+        
+        with open(self.journal_path, 'rb') as f:
+            lines = f.read().split(b"\n")
+        if lines[-1]:
+            logger.warning(f"Ignoring incomplete trailing op in {self.journal_path}")
+        return [orjson.loads(line) for line in lines[:-1] if line]
+    
+    def _compact_journal(self, next_id: Optional[int]) -> None:
+        """Drop journaled ops already covered by a snapshot ending at next_id.
+        
+        Ops for ids at or above next_id were appended after the snapshot was
+        taken and are kept so they survive the compaction. A next_id of None
+        means the snapshot covers the whole journal.
+        
+        The kept ops are written to a temp journal that is renamed over the
+        old one, so a crash at any point leaves a journal holding every op
+        the snapshot lacks. The bulk of the copy and its fsync happen
+        without _lock; only ops appended meanwhile are copied under it.
+        
+        Args:
+            next_id: next_id of the snapshot just written, or None
+        """
+        with self._lock:
+            copied = self._journal_bytes
+        with open(self._journal_str, 'rb') as f:
+            lines = f.read(copied).split(b"\n")
+        pending = b"" if next_id is None else b"".join(
+            line + b"\n" for line in lines if line and orjson.loads(line)["id"] >= next_id
+        )
+        
+        fd = os.open(self._journal_temp_str, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            _write_all(fd, pending)
+            os.fsync(fd)
+            with self._lock:
+                if next_id is not None and self._journal_bytes > copied:
+                    # Appended after the snapshot was written, so always kept
+                    with open(self._journal_str, 'rb') as f:
+                        f.seek(copied)
+                        _write_all(fd, f.read(self._journal_bytes - copied))
+                # Windows cannot replace a file that is still open
+                self._journal.close()
+                try:
+                    os.replace(self._journal_temp_str, self._journal_str)
+                finally:
+                    self._journal = open(self._journal_str, 'ab', buffering=0)
+                    self._journal_bytes = self._journal.tell()
+        finally:
+            os.close(fd)
+        self._fsync_dir()
+    
+    def _write_journal(self, payload: bytes) -> None:
+        """Append to the unbuffered journal, retrying short writes.
+        
+        If the write fails part way, the journal is cut back to
+        _journal_bytes so the next append does not glue onto a partial line.
+        """
+        view = memoryview(payload)
+        try:
+            while view:
+                view = view[self._journal.write(view):]
+        except OSError:
+            self._journal.truncate(self._journal_bytes)
+            raise
+    
     def health_check(self) -> bool:
         """Check if local storage is accessible."""
         try:
@@ -117,10 +580,16 @@ class GCSStorage(StorageBackend):
             object_name: Name of the object in the bucket
         """
         try:
-            from google.cloud import storage
-            self.client = storage.Client()
+            self.client = _get_gcs_client()
             self.bucket = self.client.bucket(bucket_name)
             self.object_name = object_name
+            # Generation of the object as last loaded or saved (0 = absent),
+            # used as a write precondition; None until the first load
+            self._generation: Optional[int] = None
+            # Set once another writer replaced the object; saves can never
+            # succeed again without a reload, so the instance goes read-only
+            self._conflict: Optional[str] = None
+            self._last_healthy = float("-inf")  # Monotonic time of last successful health check
             logger.info(f"Initialized GCSStorage: gs://{bucket_name}/{object_name}")
         except Exception as e:
             logger.error(f"Failed to initialize GCS client: {e}")
@@ -128,16 +597,22 @@ class GCSStorage(StorageBackend):
 
     def load(self) -> Dict[str, Any]:
         """Load data from GCS."""
+        from google.api_core.exceptions import NotFound
+
         try:
             blob = self.bucket.blob(self.object_name)
-            if not blob.exists():
+            try:
+                blob.reload()
+            except NotFound:
                 logger.info("No existing data in GCS, starting fresh")
+                self._generation = 0
                 return {"trees": [], "next_id": 1}
 
-            data = json.loads(blob.download_as_text())
-            logger.info(f"Loaded data from GCS: {self.object_name}")
+            data = orjson.loads(blob.download_as_bytes(if_generation_match=blob.generation))
+            self._generation = blob.generation
+            logger.info("Loaded data from GCS", extra={"object_name": self.object_name})
             return data
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in GCS object: {e}")
             raise StorageError(f"Corrupted data in GCS: {e}")
         except Exception as e:
@@ -146,21 +621,56 @@ class GCSStorage(StorageBackend):
 
     def save(self, data: Dict[str, Any]) -> None:
         """Save data to GCS."""
+        self.save_bytes(orjson.dumps(data))
+
+    def save_bytes(self, payload: bytes) -> None:
+        """Save pre-serialized data to GCS.
+
+        The upload is conditional on the object still being at the generation
+        this instance last loaded or saved, so a concurrent writer's data is
+        never silently overwritten. A failed precondition is terminal: every
+        later save fails, health checks fail and is_writable() is False.
+        """
+        from google.api_core.exceptions import PreconditionFailed
+        from google.cloud.storage.retry import DEFAULT_RETRY
+
+        if self._conflict:
+            raise StorageError(self._conflict)
         try:
             blob = self.bucket.blob(self.object_name)
             blob.upload_from_string(
-                json.dumps(data, indent=2),
-                content_type='application/json'
+                _snapshot_payload(payload),
+                content_type='application/json',
+                if_generation_match=self._generation,
+                checksum='crc32c',
+                retry=DEFAULT_RETRY
             )
-            logger.info(f"Saved data to GCS: {self.object_name}")
+            self._generation = blob.generation
+            logger.debug("Saved data to GCS", extra={"object_name": self.object_name, "bytes": len(payload)})
+        except PreconditionFailed as e:
+            logger.error(f"GCS object modified by another writer, refusing further writes: {e}")
+            self._conflict = f"GCS object {self.object_name} was modified by another writer"
+            raise StorageError(self._conflict)
         except Exception as e:
             logger.error(f"Failed to save to GCS: {e}")
             raise StorageError(f"Failed to save to GCS: {e}")
 
+    def is_writable(self) -> bool:
+        """Check that no other writer has replaced the object."""
+        return self._conflict is None
+
     def health_check(self) -> bool:
-        """Check if GCS bucket is accessible."""
+        """Check if GCS bucket is accessible, reusing a success for HEALTH_CHECK_TTL seconds."""
+        if self._conflict:
+            return False
+        now = time.monotonic()
+        if now - self._last_healthy < HEALTH_CHECK_TTL:
+            return True
         try:
-            return self.bucket.exists()
+            healthy = self.bucket.exists()
+            if healthy:
+                self._last_healthy = now
+            return healthy
         except Exception as e:
             logger.error(f"GCS health check failed: {e}")
             return False
@@ -178,10 +688,16 @@ class S3Storage(StorageBackend):
             region: AWS region (optional, uses default if not specified)
         """
         try:
-            import boto3
-            self.s3_client = boto3.client('s3', region_name=region)
+            from botocore.config import Config
+            config = Config(
+                max_pool_connections=32,
+                tcp_keepalive=True,
+                retries={"mode": "adaptive", "total_max_attempts": 3}
+            )
+            self.s3_client = _get_boto3_session().client('s3', region_name=region, config=config)
             self.bucket_name = bucket_name
             self.object_key = object_key
+            self._last_healthy = float("-inf")  # Monotonic time of last successful health check
             logger.info(f"Initialized S3Storage: s3://{bucket_name}/{object_key}")
         except Exception as e:
             logger.error(f"Failed to initialize S3 client: {e}")
@@ -191,13 +707,13 @@ class S3Storage(StorageBackend):
         """Load data from S3."""
         try:
             response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.object_key)
-            data = json.loads(response['Body'].read().decode('utf-8'))
-            logger.info(f"Loaded data from S3: {self.object_key}")
+            data = orjson.loads(response['Body'].read())
+            logger.info("Loaded data from S3", extra={"object_key": self.object_key})
             return data
         except self.s3_client.exceptions.NoSuchKey:
             logger.info("No existing data in S3, starting fresh")
             return {"trees": [], "next_id": 1}
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"Invalid JSON in S3 object: {e}")
             raise StorageError(f"Corrupted data in S3: {e}")
         except Exception as e:
@@ -206,22 +722,30 @@ class S3Storage(StorageBackend):
 
     def save(self, data: Dict[str, Any]) -> None:
         """Save data to S3."""
+        self.save_bytes(orjson.dumps(data))
+
+    def save_bytes(self, payload: bytes) -> None:
+        """Save pre-serialized data to S3."""
         try:
             self.s3_client.put_object(
                 Bucket=self.bucket_name,
                 Key=self.object_key,
-                Body=json.dumps(data, indent=2).encode('utf-8'),
+                Body=_snapshot_payload(payload),
                 ContentType='application/json'
             )
-            logger.info(f"Saved data to S3: {self.object_key}")
+            logger.debug("Saved data to S3", extra={"object_key": self.object_key, "bytes": len(payload)})
         except Exception as e:
             logger.error(f"Failed to save to S3: {e}")
             raise StorageError(f"Failed to save to S3: {e}")
 
     def health_check(self) -> bool:
-        """Check if S3 bucket is accessible."""
+        """Check if S3 bucket is accessible, reusing a success for HEALTH_CHECK_TTL seconds."""
+        now = time.monotonic()
+        if now - self._last_healthy < HEALTH_CHECK_TTL:
+            return True
         try:
             self.s3_client.head_bucket(Bucket=self.bucket_name)
+            self._last_healthy = now
             return True
         except Exception as e:
             logger.error(f"S3 health check failed: {e}")
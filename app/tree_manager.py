@@ -1,32 +1,92 @@
 """Tree management logic for creating and querying tree structures."""
 
 import logging
-from typing import List, Optional, Dict, Any
-from app.models import TreeNode
+import sys
+from itertools import accumulate
+from typing import List, Optional, Dict, Any, Tuple
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Parent markers in TreeManager._parents
+ROOT = -1  # Node is the root of a tree
+MISSING = -2  # No node has this id (slot 0, or an id skipped in old data)
+
+# States with more ids than this persist labels as indexes into a vocabulary
+# of distinct labels instead of repeating each label
+VOCAB_MIN_NODES = 100
+
 
 class TreeManager:
-    """Manages tree data structures with in-memory operations."""
+    """Manages tree data structures with in-memory operations.
+    
+    Nodes are stored as parallel arrays indexed by node id: _labels[id] and
+    _parents[id]. Child ids are indexed in CSR form (_child_ids sliced by
+    _child_offsets) for the ids present at the last reindex, with children
+    created since kept in _extra_children. Inserts are a few list appends and
+    the persisted state is the arrays themselves; the nested {"id", "label",
+    "children"} dicts used by the API are only built on demand.
+    """
     
     def __init__(self):
         """Initialize the tree manager with empty state."""
-        self.trees: List[TreeNode] = []
         self.next_id: int = 1
-        self._node_map: Dict[int, TreeNode] = {}  # Fast lookup by ID
+        self.version: int = 0  # Bumped on every change, used as the GET ETag
+        self._labels: List[Optional[str]] = [None]
+        self._parents: List[int] = [MISSING]
+        self._roots: List[int] = []
+        self._child_offsets: List[int] = []
+        self._child_ids: List[int] = []
+        self._indexed: int = 0  # Ids covered by the CSR child index
+        self._extra_children: Dict[int, List[int]] = {}
+        self._index_children()
+        self._trees_bytes: Optional[bytes] = None  # Serialized trees, reset on change
+        # Serialized vocabulary state for ids below _state_mark; the arrays
+        # are append-only, so get_state_chunks only encodes the ids added since
+        self._state_mark: int = 0
+        self._vocab: Dict[str, int] = {}
+        self._vocab_json = bytearray()
+        self._label_ids_json = bytearray()
+        self._parents_json = bytearray()
     
     def load_state(self, data: Dict[str, Any]) -> None:
         """Load tree state from persisted data.
         
+        The flat arrays in data are adopted without copying, so the caller
+        must not reuse them; get_state() always returns fresh lists.
+        
         Args:
-            data: Dictionary containing 'trees' and 'next_id'
+            data: Dictionary as returned by get_state (or with nested 'trees'
+                as written by older versions), plus an optional 'journal' of
+                ops recorded after the snapshot was taken
         """
         try:
-            self.trees = [TreeNode(**tree) for tree in data.get("trees", [])]
-            self.next_id = data.get("next_id", 1)
-            self._rebuild_node_map()
-            logger.info(f"Loaded {len(self.trees)} trees, next_id={self.next_id}")
+            next_id = data.get("next_id", 1)
+            if "vocab" in data:
+                vocab = [sys.intern(label) for label in data["vocab"]]
+                labels = [vocab[label_id] if label_id >= 0 else None for label_id in data["label_ids"]]
+                labels, parents = self._arrays_from_flat(labels, data["parents"], next_id)
+            elif "labels" in data:
+                labels, parents = self._arrays_from_flat(data["labels"], data["parents"], next_id)
+            else:
+                labels, parents = self._arrays_from_trees(data.get("trees", []), next_id)
+            
+            self.next_id = next_id
+            self._labels, self._parents = labels, parents
+            self._index_children()
+            self._state_mark = 0
+            self._vocab.clear()
+            self._vocab_json.clear()
+            self._label_ids_json.clear()
+            self._parents_json.clear()
+            for op in data.get("journal", []):
+                self.apply_op(op)
+            # next_id only grows, so versions do not repeat across restarts
+            # unless creates were lost before a save (see main.BOOT_ID)
+            self.version = self.next_id
+            self._trees_bytes = None
+            logger.info("Loaded trees", extra={"trees": len(self._roots), "next_id": self.next_id})
         except Exception as e:
             logger.error(f"Failed to load state: {e}", exc_info=True)
             raise ValueError(f"Invalid tree data format: {e}")
@@ -34,76 +94,416 @@ class TreeManager:
     def get_state(self) -> Dict[str, Any]:
         """Get current tree state for persistence.
         
+        The state is the flat node arrays, indexed by node id. Slot 0 and
+        unused ids have a MISSING parent. Above VOCAB_MIN_NODES ids, labels
+        are stored as 'label_ids' into a 'vocab' of distinct labels (-1 for
+        unused ids); otherwise as 'labels' (None for unused ids).
+        
+        Returns:
+            Dictionary containing 'labels' or 'vocab' and 'label_ids', plus
+            'parents' and 'next_id'
+        """
+        if self.next_id <= VOCAB_MIN_NODES:
+            return {"labels": list(self._labels), "parents": list(self._parents), "next_id": self.next_id}
+        
+        vocab: Dict[str, int] = {}
+        label_ids = [-1 if label is None else vocab.setdefault(label, len(vocab)) for label in self._labels]
+        return {"vocab": list(vocab), "label_ids": label_ids, "parents": list(self._parents), "next_id": self.next_id}
+    
+    def get_state_bytes(self) -> bytes:
+        """Get current tree state for persistence, serialized as JSON.
+        
+        Returns:
+            JSON encoding of get_state()
+        """
+        return b"".join(self.get_state_chunks())
+    
+    def get_state_chunks(self) -> List[bytes]:
+        """Get current tree state for persistence as consecutive JSON pieces.
+        
+        The large pieces are internal buffers, returned without copying.
+        Creates do not touch them, so they stay valid (and consistent with
+        the next_id at the time of the call) until the next call.
+        
+        Returns:
+            Pieces that concatenate to the JSON encoding of get_state()
+        """
+        if self.next_id <= VOCAB_MIN_NODES:
+            return [orjson.dumps({"labels": self._labels, "parents": self._parents, "next_id": self.next_id})]
+        
+        mark = self._state_mark
+        if mark < self.next_id:
+            vocab = self._vocab
+            had_vocab = bool(vocab)
+            label_ids: List[int] = []
+            new_labels: List[str] = []
+            for label in self._labels[mark:]:
+                if label is None:
+                    label_ids.append(-1)
+                    continue
+                label_id = vocab.get(label)
+                if label_id is None:
+                    label_id = vocab[label] = len(vocab)
+                    new_labels.append(label)
+                label_ids.append(label_id)
+            if new_labels:
+                self._vocab_json += (b"," if had_vocab else b"") + orjson.dumps(new_labels)[1:-1]
+            separator = b"," if mark else b""
+            self._label_ids_json += separator + orjson.dumps(label_ids)[1:-1]
+            self._parents_json += separator + orjson.dumps(self._parents[mark:])[1:-1]
+            self._state_mark = self.next_id
+        return [
+            b'{"vocab":[', self._vocab_json,
+            b'],"label_ids":[', self._label_ids_json,
+            b'],"parents":[', self._parents_json,
+            b'],"next_id":%d}' % self.next_id
+        ]
+    
+    def get_trees_bytes(self) -> bytes:
+        """Get all trees serialized as JSON, cached until the next change.
+        
+        Returns:
+            JSON encoding of get_all_trees()
+        """
+        if self._trees_bytes is None:
+            try:
+                self._trees_bytes = orjson.dumps(self.get_all_trees())
+            except orjson.JSONEncodeError:
+                # orjson gives up on nesting deeper than 254 levels
+                self._trees_bytes = self._dump_trees()
+        return self._trees_bytes
+    
+    def _dump_trees(self) -> bytes:
+        """Serialize all trees without nesting limits.
+        
+        Walks the arrays with an explicit stack of node ids and literal
+        closing tokens, so tree depth is bounded only by memory.
+        
         Returns:
-            Dictionary containing 'trees' and 'next_id'
+            JSON encoding of get_all_trees()
         """
-        return {
-            "trees": [tree.model_dump() for tree in self.trees],
-            "next_id": self.next_id
-        }
+        labels = self._labels
+        out = [b"["]
+        # Ids are pushed in reverse with b"," between siblings, so popping
+        # emits them in order
+        stack: List[Any] = [b"]"]
+        for index, node_id in enumerate(reversed(self._roots)):
+            stack.extend((b",", node_id) if index else (node_id,))
+        while stack:
+            item = stack.pop()
+            if isinstance(item, bytes):
+                out.append(item)
+                continue
+            out.append(b'{"id":%d,"label":%b,"children":[' % (item, orjson.dumps(labels[item])))
+            stack.append(b"]}")
+            for index, child_id in enumerate(reversed(self._child_ids_of(item))):
+                stack.extend((b",", child_id) if index else (child_id,))
+        return b"".join(out)
     
-    def get_all_trees(self) -> List[TreeNode]:
+    def get_all_trees(self) -> List[Dict[str, Any]]:
         """Get all trees.
         
+        Built in one pass in id order: a parent always has a smaller id than
+        its children and child lists are in id order, so each node's parent
+        is already built when the node is reached.
+        
         Returns:
-            List of all root trees
+            List of all root trees as nested dicts, built from the arrays
         """
-        return self.trees
+        child_lists: List[Optional[List[Dict[str, Any]]]] = [None] * self.next_id
+        trees: List[Dict[str, Any]] = []
+        
+        for node_id, label, parent_id in zip(range(self.next_id), self._labels, self._parents):
+            if parent_id < 0:
+                if parent_id == MISSING:
+                    continue
+                siblings = trees
+            else:
+                siblings = child_lists[parent_id]
+            children = child_lists[node_id] = []
+            siblings.append({"id": node_id, "label": label, "children": children})
+        
+        return trees
     
-    def create_node(self, label: str, parent_id: Optional[int] = None) -> TreeNode:
+    def create_node(self, label: str, parent_id: Optional[int] = None) -> Dict[str, Any]:
         """Create a new node and attach it to a parent or as a new root.
         
         Args:
             label: Label for the new node
             parent_id: ID of parent node, or None to create a new root
-            
+        
         Returns:
             The newly created node
-            
+        
         Raises:
             ValueError: If parent_id is provided but parent not found
         """
-        new_node = TreeNode(id=self.next_id, label=label, children=[])
-        self.next_id += 1
+        return self.create_nodes([(label, parent_id)])[0]
+    
+    def create_nodes(self, specs: List[Tuple[str, Optional[int]]]) -> List[Dict[str, Any]]:
+        """Create several nodes, all or nothing.
+        
+        A parent may be an existing node or a node created earlier in the
+        same batch. Every parent is checked before anything is created, and
+        the ids are allocated as one consecutive range.
+        
+        Args:
+            specs: (label, parent_id) pairs in creation order
+        
+        Returns:
+            The newly created nodes, in order
+        
+        Raises:
+            ValueError: If any parent_id is not found; the message lists all of them
+        """
+        first_id = self.next_id
+        parents = self._parents
+        missing = [
+            parent_id
+            for node_id, (_, parent_id) in enumerate(specs, first_id)
+            if parent_id is not None
+            and not (first_id <= parent_id < node_id or 0 < parent_id < first_id and parents[parent_id] != MISSING)
+        ]
+        if missing:
+            logger.warning("Parent node not found", extra={"parent_ids": missing})
+            if len(missing) == 1:
+                raise ValueError(f"Parent node with id {missing[0]} not found")
+            raise ValueError(f"Parent nodes with ids {', '.join(map(str, missing))} not found")
+        
+        # Repeated labels share one string object
+        labels = [sys.intern(label) for label, _ in specs]
+        new_parents = [ROOT if parent_id is None else parent_id for _, parent_id in specs]
+        self._labels.extend(labels)
+        parents.extend(new_parents)
+        
+        roots, extra_children = self._roots, self._extra_children
+        for node_id, parent_id in enumerate(new_parents, first_id):
+            if parent_id == ROOT:
+                roots.append(node_id)
+            elif parent_id in extra_children:
+                extra_children[parent_id].append(node_id)
+            else:
+                extra_children[parent_id] = [node_id]
+        
+        self.next_id += len(specs)
+        if self.next_id > 2 * self._indexed:
+            # Fold the overflow into the CSR index; doubling keeps the
+            # rebuilds amortized O(1) per create
+            self._index_children()
+        self.version += len(specs)
+        self._trees_bytes = None
+        logger.debug("Created nodes", extra={"first_id": first_id, "count": len(specs)})
+        
+        return [{"id": node_id, "label": label, "children": []} for node_id, label in enumerate(labels, first_id)]
+    
+    def discard_nodes(self, first_id: int) -> None:
+        """Undo the most recent creates, from first_id up.
+        
+        Used when the creates could not be journaled, so that no later op
+        can reference a node that storage never saw.
+        
+        Args:
+            first_id: First id to discard; must be a create since the last
+                load_state or get_state_chunks call
+        """
+        if not 0 < first_id <= self.next_id or first_id < self._state_mark:
+            raise ValueError(f"Cannot discard nodes from id {first_id}")
         
-        if parent_id is None:
-            # Create new root tree
-            self.trees.append(new_node)
-            self._node_map[new_node.id] = new_node
-            logger.info(f"Created new root node: id={new_node.id}, label={label}")
+        if first_id < self._indexed:
+            del self._labels[first_id:], self._parents[first_id:]
+            self._index_children()
         else:
-            # Find parent and attach
-            parent = self._find_node(parent_id)
-            if parent is None:
-                logger.warning(f"Parent node not found: parent_id={parent_id}")
-                raise ValueError(f"Parent node with id {parent_id} not found")
-            
-            parent.children.append(new_node)
-            self._node_map[new_node.id] = new_node
-            logger.info(f"Created child node: id={new_node.id}, label={label}, parent_id={parent_id}")
+            # Children are appended in id order, so the discarded ids are
+            # at the ends of their lists
+            roots, extra_children = self._roots, self._extra_children
+            for node_id in range(self.next_id - 1, first_id - 1, -1):
+                parent_id = self._parents[node_id]
+                if parent_id == ROOT:
+                    roots.pop()
+                else:
+                    siblings = extra_children[parent_id]
+                    siblings.pop()
+                    if not siblings:
+                        del extra_children[parent_id]
+            del self._labels[first_id:], self._parents[first_id:]
         
-        return new_node
+        self.next_id = first_id
+        self.version += 1
+        self._trees_bytes = None
+        logger.debug("Discarded nodes", extra={"first_id": first_id})
     
-    def _find_node(self, node_id: int) -> Optional[TreeNode]:
-        """Find a node by ID using the node map.
+    def apply_op(self, op: Dict[str, Any]) -> None:
+        """Replay a journaled op.
+        
+        Ops for ids the current state already covers are skipped, so replaying
+        a journal on top of a newer snapshot is harmless.
         
         Args:
-            node_id: ID of the node to find
-            
+            op: Op as recorded by the storage journal
+        
+        Raises:
+            ValueError: If the op is unknown or its parent is missing
+        """
+        if op.get("op") != "create":
+            raise ValueError(f"Unknown journal op: {op.get('op')}")
+        if op["id"] < self.next_id:
+            return
+        
+        # Ids skipped by the journal (failed creates in older versions)
+        # stay empty slots
+        while self.next_id < op["id"]:
+            self._labels.append(None)
+            self._parents.append(MISSING)
+            self.next_id += 1
+        self.create_node(op["label"], op.get("parent_id"))
+    
+    def children_of(self, node_id: int) -> List[int]:
+        """Get the IDs of a node's children.
+        
+        Args:
+            node_id: ID of the node
+        
+        Returns:
+            Child IDs in creation order
+        
+        Raises:
+            ValueError: If the node is not found
+        """
+        if not self._exists(node_id):
+            raise ValueError(f"Node with id {node_id} not found")
+        return self._child_ids_of(node_id)
+    
+    def _child_ids_of(self, node_id: int) -> List[int]:
+        """Get a node's child IDs from the CSR index plus the overflow.
+        
+        Children in the overflow were created after the last reindex, so
+        they always come after the indexed ones.
+        
+        Args:
+            node_id: ID of an existing node
+        
         Returns:
-            The node if found, None otherwise
+            A new list of child IDs in creation order
         """
-        return self._node_map.get(node_id)
+        if node_id < self._indexed:
+            child_ids = self._child_ids[self._child_offsets[node_id]:self._child_offsets[node_id + 1]]
+        else:
+            child_ids = []
+        extra = self._extra_children.get(node_id)
+        return child_ids + extra if extra else child_ids
     
-    def _rebuild_node_map(self) -> None:
-        """Rebuild the node map from current trees for fast lookups."""
-        self._node_map.clear()
+    def _index_children(self) -> None:
+        """Rebuild the roots and the CSR child index from the parent array.
         
-        def add_to_map(node: TreeNode):
-            self._node_map[node.id] = node
-            for child in node.children:
-                add_to_map(child)
+        A counting sort over the parents: one pass sizes each node's slice,
+        a second fills the slices in id order, which is creation order.
+        """
+        parents = self._parents
+        size = len(parents)
+        counts = [0] * (size + 1)
+        roots: List[int] = []
+        for node_id, parent_id in enumerate(parents):
+            if parent_id > 0:
+                counts[parent_id + 1] += 1
+            elif parent_id == ROOT:
+                roots.append(node_id)
         
-        for tree in self.trees:
-            add_to_map(tree)
-
+        offsets = list(accumulate(counts))
+        child_ids = [0] * offsets[-1]
+        slots = offsets[:-1]
+        for node_id, parent_id in enumerate(parents):
+            if parent_id > 0:
+                child_ids[slots[parent_id]] = node_id
+                slots[parent_id] += 1
+        
+        self._roots = roots
+        self._child_offsets, self._child_ids = offsets, child_ids
+        self._indexed = size
+        self._extra_children = {}
+    
+    @staticmethod
+    def _arrays_from_flat(labels: List[Optional[str]], parents: List[int], next_id: int) -> Tuple[List[Optional[str]], List[int]]:
+        """Validate flat persisted arrays.
+        
+        Parents are always created before their children, so a single pass
+        in id order sees every parent before it is referenced. The lists are
+        adopted rather than copied; labels are interned in place.
+        
+        Args:
+            labels: Persisted labels, indexed by node id
+            parents: Persisted parent ids, indexed by node id
+            next_id: Persisted next_id, the length of both arrays
+        
+        Returns:
+            (labels, parents) for the TreeManager
+        
+        Raises:
+            ValueError: If the arrays are inconsistent
+        """
+        if len(labels) != next_id or len(parents) != next_id or (next_id and parents[0] != MISSING):
+            raise ValueError("Node arrays do not match next_id")
+        
+        for node_id in range(1, next_id):
+            parent_id = parents[node_id]
+            if parent_id == MISSING:
+                labels[node_id] = None
+                continue
+            if not isinstance(labels[node_id], str):
+                raise ValueError(f"Malformed label for node {node_id}")
+            # Repeated labels share one string object
+            labels[node_id] = sys.intern(labels[node_id])
+            if parent_id != ROOT and not (
+                isinstance(parent_id, int) and 0 < parent_id < node_id and parents[parent_id] != MISSING
+            ):
+                raise ValueError(f"Invalid parent {parent_id} for node {node_id}")
+        return labels, parents
+    
+    @staticmethod
+    def _arrays_from_trees(trees: List[Dict[str, Any]], next_id: int) -> Tuple[List[Optional[str]], List[int]]:
+        """Flatten nested trees, as persisted by older versions, into arrays.
+        
+        Args:
+            trees: Nested {"id", "label", "children"} root nodes
+            next_id: Persisted next_id, the size of the arrays
+        
+        Returns:
+            (labels, parents) for the TreeManager
+        
+        Raises:
+            ValueError: If a node is malformed, its id is duplicated or it
+                has a smaller id than its parent
+        """
+        labels: List[Optional[str]] = [None] * next_id
+        parents = [MISSING] * next_id
+        
+        # Iterative DFS; sibling order comes from ids when the child index
+        # is built, so children that are out of id order in a hand-edited
+        # file end up in creation order
+        stack = [(tree, ROOT) for tree in reversed(trees)]
+        while stack:
+            node, parent_id = stack.pop()
+            node_id, label = node.get("id"), node.get("label")
+            if not isinstance(node_id, int) or not isinstance(label, str):
+                raise ValueError(f"Malformed node: {node}")
+            if not 0 < node_id < next_id or parents[node_id] != MISSING:
+                raise ValueError(f"Duplicate or out of range node id: {node_id}")
+            
+            if node_id < parent_id:
+                raise ValueError(f"Node {node_id} is older than its parent {parent_id}")
+            
+            # Repeated labels share one string object
+            labels[node_id] = sys.intern(label)
+            parents[node_id] = parent_id
+            stack.extend((child, node_id) for child in node.get("children", []))
+        return labels, parents
+    
+    def _exists(self, node_id: int) -> bool:
+        """Check whether a node with the given ID exists.
+        
+        Args:
+            node_id: ID of the node to check
+        
+        Returns:
+            True if the node exists, False otherwise
+        """
+        return 0 < node_id < self.next_id and self._parents[node_id] != MISSING
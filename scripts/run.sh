@@ -117,5 +117,6 @@ echo "Starting server..."
 echo ""
 
 # Run the server
-uvicorn app.main:app --reload --host 0.0.0.0 --port 8000
+# uvloop and httptools come with uvicorn[standard] (not available on Windows)
+uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 --loop uvloop --http httptools
 
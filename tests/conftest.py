@@ -0,0 +1,67 @@
+"""Shared test fixtures."""
+
+import pytest
+from app.storage import LocalFileStorage, StorageBackend
+
+
+class FakeStorage(StorageBackend):
+    """In-memory backend without a journal, so every create needs a full save.
+    
+    Args:
+        on_save: Called with each state before it is kept; may block to
+            simulate a slow backend or raise StorageError to fail the save
+    """
+    
+    def __init__(self, on_save=None):
+        self.on_save = on_save
+        self.saved = None
+        self.saves = 0
+        self.saving = False
+        self.closed_during_save = False
+    
+    def load(self):
+        return {"trees": [], "next_id": 1}
+    
+    def save(self, data):
+        self.saves += 1
+        self.saving = True
+        try:
+            if self.on_save:
+                self.on_save(data)
+            self.saved = data
+        finally:
+            self.saving = False
+    
+    def health_check(self):
+        return True
+    
+    def close(self):
+        self.closed_during_save = self.saving
+
+
+@pytest.fixture
+def open_storage():
+    """Open LocalFileStorage instances that are closed after the test.
+    
+    Each storage holds its journal open, so it has to be closed to avoid
+    leaking file descriptors (and ResourceWarnings) between tests.
+    """
+    opened = []
+    
+    def _open(path):
+        storage = LocalFileStorage(str(path))
+        opened.append(storage)
+        return storage
+    
+    yield _open
+    for storage in opened:
+        storage.close()
+
+
+@pytest.fixture
+def fake_storage(monkeypatch):
+    """Make the app start with a FakeStorage backend."""
+    from app import main
+    storage = FakeStorage()
+    monkeypatch.setattr(main, "create_storage_backend", lambda *args, **kwargs: storage)
+    return storage
@@ -1,10 +1,15 @@
 """Tests for API endpoints."""
 
+import asyncio
+import threading
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app, tree_manager, storage
 from app.tree_manager import TreeManager
-from app.storage import LocalFileStorage
+from app import storage as storage_module
+from app.storage import LocalFileStorage, StorageError
 
 
 @pytest.fixture(autouse=True)
@@ -15,11 +20,13 @@ def reset_state(tmp_path):
     # Create fresh instances
     from app import main
     main.tree_manager = TreeManager()
-    main.storage = LocalFileStorage(str(tmp_path / "test_trees.json"))
+    test_storage = LocalFileStorage(str(tmp_path / "test_trees.json"))
+    main.storage = test_storage
     
     yield
     
     # Cleanup
+    test_storage.close()
     main.tree_manager = TreeManager()
 
 
@@ -149,3 +156,244 @@ def test_api_documentation(client):
     openapi = response.json()
     assert openapi["info"]["title"] == "HTTP Server Coding Challenge"
 
+
+def test_background_flush_on_shutdown(fake_storage, monkeypatch):
+    """Test that state is saved by the flusher for backends without a journal."""
+    monkeypatch.setenv("FLUSH_INTERVAL_MS", "60000")
+
+    with TestClient(app) as client:
+        client.post("/api/tree", json={"label": "root"})
+        assert fake_storage.saved is None
+
+    assert fake_storage.saved["next_id"] == 2
+    assert fake_storage.saved["labels"][1] == "root"
+
+
+def test_create_not_blocked_by_slow_flush(fake_storage, monkeypatch):
+    """Test that a create is served while a background save is in progress."""
+    saving = threading.Event()
+    release = threading.Event()
+    fake_storage.on_save = lambda data: (saving.set(), release.wait(5))
+    monkeypatch.setenv("FLUSH_INTERVAL_MS", "0")
+
+    with TestClient(app) as client:
+        client.post("/api/tree", json={"label": "root"})
+        assert saving.wait(5)
+        
+        start = time.monotonic()
+        response = client.post("/api/tree", json={"label": "child", "parent_id": 1})
+        elapsed = time.monotonic() - start
+        release.set()
+
+    assert response.status_code == 201
+    assert elapsed < 1
+
+
+def test_shutdown_waits_for_save_in_progress(fake_storage, monkeypatch):
+    """Test that shutdown neither cancels nor closes under a running save."""
+    saving = threading.Event()
+    release = threading.Event()
+
+    def fail_first_save(data):
+        if not saving.is_set():
+            saving.set()
+            release.wait(5)
+            raise StorageError("backend down")
+
+    fake_storage.on_save = fail_first_save
+    monkeypatch.setenv("FLUSH_INTERVAL_MS", "0")
+
+    with TestClient(app) as client:
+        client.post("/api/tree", json={"label": "root"})
+        assert saving.wait(5)
+        threading.Timer(0.2, release.set).start()
+
+    # The failed save is retried on shutdown, after it has returned
+    assert fake_storage.saved["labels"][1] == "root"
+    assert not fake_storage.closed_during_save
+
+
+def test_failed_flush_backs_off(monkeypatch):
+    """Test that the wait after failed saves doubles up to the cap and resets on success."""
+    from app import main
+
+    results = iter([False, False, False, False, True, False])
+    delays = []
+
+    async def flush():
+        main.dirty_event.set()
+        return next(results)
+
+    async def record_wait(delay):
+        delays.append(delay)
+        if len(delays) == 7:
+            main.stop_event.set()
+
+    async def run():
+        monkeypatch.setattr(main, "dirty_event", asyncio.Event())
+        monkeypatch.setattr(main, "stop_event", asyncio.Event())
+        main.dirty_event.set()
+        await main._flush_periodically(0.05)
+
+    monkeypatch.setattr(main, "_flush", flush)
+    monkeypatch.setattr(main, "_wait_unless_stopped", record_wait)
+    monkeypatch.setattr(main, "FLUSH_RETRY_MAX_SECONDS", 0.3)
+    asyncio.run(run())
+
+    assert delays == pytest.approx([0.05, 0.1, 0.2, 0.3, 0.3, 0.05, 0.1])
+
+
+def test_failed_journal_append_rolls_back_create(tmp_path, monkeypatch, open_storage):
+    """Test that a node whose journal append failed is not kept in memory."""
+    from app import main
+    
+    path = tmp_path / "trees.json"
+    backend = open_storage(path)
+    real_save_ops = backend.save_ops
+    
+    def failing_once(ops):
+        backend.save_ops = real_save_ops
+        raise StorageError("disk full")
+    
+    backend.save_ops = failing_once
+    monkeypatch.setattr(main, "create_storage_backend", lambda *args, **kwargs: backend)
+    monkeypatch.setenv("FLUSH_INTERVAL_MS", "60000")
+    with TestClient(app) as client:
+        assert client.post("/api/tree", json={"label": "lost"}).status_code == 500
+        assert client.get("/api/tree").json() == []
+        assert client.post("/api/tree/batch", json={"ops": [{"label": "root"}]}).status_code == 201
+        assert client.post("/api/tree", json={"label": "child", "parent_id": 1}).status_code == 201
+    
+    # Restarting replays the journal without a gap
+    monkeypatch.setattr(main, "create_storage_backend", lambda *args, **kwargs: open_storage(path))
+    with TestClient(app) as client:
+        tree = client.get("/api/tree").json()[0]
+        assert tree["label"] == "root"
+        assert tree["children"][0]["label"] == "child"
+
+
+def test_create_not_blocked_by_slow_snapshot_fsync(tmp_path, monkeypatch, open_storage):
+    """Test that journal appends do not wait for a snapshot write in progress."""
+    from app import main
+    
+    path = tmp_path / "trees.json"
+    syncing = threading.Event()
+    release = threading.Event()
+    real_fsync = storage_module.os.fsync
+    
+    def slow_first_fsync(fd):
+        if not syncing.is_set():
+            syncing.set()
+            release.wait(5)
+        real_fsync(fd)
+    
+    # Every create asks for compaction, so the flusher writes a snapshot
+    monkeypatch.setattr(LocalFileStorage, "COMPACTION_MIN_BYTES", 0)
+    monkeypatch.setattr(storage_module.os, "fsync", slow_first_fsync)
+    monkeypatch.setattr(main, "create_storage_backend", lambda *args, **kwargs: open_storage(path))
+    monkeypatch.setenv("FLUSH_INTERVAL_MS", "0")
+    
+    with TestClient(app) as client:
+        client.post("/api/tree", json={"label": "root"})
+        assert syncing.wait(5)
+        
+        start = time.monotonic()
+        response = client.post("/api/tree", json={"label": "child", "parent_id": 1})
+        elapsed = time.monotonic() - start
+        release.set()
+    
+    assert response.status_code == 201
+    assert elapsed < 1
+    # The create journaled during the snapshot write survives compaction
+    restarted = TreeManager()
+    restarted.load_state(open_storage(path).load())
+    assert restarted.children_of(1) == [2]
+
+
+def test_startup_compacts_long_journal(tmp_path, monkeypatch, open_storage):
+    """Test that a journal larger than half the snapshot is folded in on startup."""
+    from app import main
+    
+    path = tmp_path / "trees.json"
+    seed = open_storage(path)
+    seed.save({"trees": [], "next_id": 1})
+    seed.save_op({"op": "create", "id": 1, "label": "root", "parent_id": None})
+    seed.close()
+    
+    monkeypatch.setattr(main, "create_storage_backend", lambda *args, **kwargs: open_storage(path))
+    with TestClient(app) as client:
+        assert client.get("/api/tree").json()[0]["label"] == "root"
+        assert path.with_suffix(".jsonl").read_bytes() == b""
+    
+    assert open_storage(path).load()["labels"] == [None, "root"]
+
+
+def test_create_rejected_when_storage_not_writable(client, monkeypatch):
+    """Test that creates are refused once storage can no longer persist them."""
+    from app import main
+    monkeypatch.setattr(main.storage, "is_writable", lambda: False)
+    
+    assert client.post("/api/tree", json={"label": "root"}).status_code == 503
+    assert client.post("/api/tree/batch", json={"ops": [{"label": "root"}]}).status_code == 503
+    assert client.get("/api/tree").json() == []
+
+
+def test_get_trees_etag(client):
+    """Test that unchanged trees are answered with 304 Not Modified."""
+    client.post("/api/tree", json={"label": "root"})
+    
+    response = client.get("/api/tree")
+    etag = response.headers["etag"]
+    
+    response = client.get("/api/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    
+    client.post("/api/tree", json={"label": "root2"})
+    response = client.get("/api/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+
+def test_batch_create_nodes(client):
+    """Test creating a root and its children in one batch request."""
+    response = client.post("/api/tree/batch", json={"ops": [
+        {"label": "root"},
+        {"label": "bear", "parent_id": 1},
+        {"label": "cat", "parent_id": 2}
+    ]})
+    
+    assert response.status_code == 201
+    assert [node["id"] for node in response.json()] == [1, 2, 3]
+    
+    trees = client.get("/api/tree").json()
+    assert trees[0]["children"][0]["children"][0]["label"] == "cat"
+
+
+def test_batch_create_parent_not_found(client):
+    """Test that a batch with a missing parent creates nothing."""
+    response = client.post("/api/tree/batch", json={"ops": [
+        {"label": "root"},
+        {"label": "orphan", "parent_id": 999}
+    ]})
+    
+    assert response.status_code == 404
+    assert client.get("/api/tree").json() == []
+
+
+def test_get_trees_etag_differs_across_restarts(client, monkeypatch):
+    """Test that a reused version after a restart does not match an old ETag."""
+    from app import main
+    
+    client.post("/api/tree", json={"label": "root"})
+    etag = client.get("/api/tree").headers["etag"]
+    
+    # A crash before the flush loses the create, and the restarted process
+    # reaches the same version with different content
+    monkeypatch.setattr(main, "BOOT_ID", "restarted")
+    main.tree_manager = TreeManager()
+    client.post("/api/tree", json={"label": "other"})
+    
+    response = client.get("/api/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()[0]["label"] == "other"
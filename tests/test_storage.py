@@ -2,19 +2,22 @@
 
 import json
 import pytest
+import orjson
 from pathlib import Path
-from app.storage import LocalFileStorage, StorageError
+from unittest.mock import MagicMock
+from app import storage as storage_module
+from app.storage import GCSStorage, LocalFileStorage, S3Storage, StorageError
 
 
-@pytest.fixture
-def temp_storage_path(tmp_path):
-    """Provide a temporary storage path."""
-    return tmp_path / "test_trees.json"
+@pytest.fixture(params=["json", "mpk"])
+def temp_storage_path(tmp_path, request):
+    """Provide a temporary storage path, once per snapshot format."""
+    return tmp_path / f"test_trees.{request.param}"
 
 
-def test_local_storage_save_and_load(temp_storage_path):
+def test_local_storage_save_and_load(temp_storage_path, open_storage):
     """Test saving and loading data with local storage."""
-    storage = LocalFileStorage(str(temp_storage_path))
+    storage = open_storage(temp_storage_path)
     
     test_data = {
         "trees": [{"id": 1, "label": "root", "children": []}],
@@ -27,17 +30,17 @@ def test_local_storage_save_and_load(temp_storage_path):
     assert loaded_data == test_data
 
 
-def test_local_storage_load_nonexistent(temp_storage_path):
+def test_local_storage_load_nonexistent(temp_storage_path, open_storage):
     """Test loading when file doesn't exist returns empty state."""
-    storage = LocalFileStorage(str(temp_storage_path))
+    storage = open_storage(temp_storage_path)
     data = storage.load()
     
     assert data == {"trees": [], "next_id": 1}
 
 
-def test_local_storage_corrupted_file(temp_storage_path):
+def test_local_storage_corrupted_file(temp_storage_path, open_storage):
     """Test error handling for corrupted JSON file."""
-    storage = LocalFileStorage(str(temp_storage_path))
+    storage = open_storage(temp_storage_path)
     
     # Write invalid JSON
     temp_storage_path.parent.mkdir(parents=True, exist_ok=True)
@@ -47,9 +50,61 @@ def test_local_storage_corrupted_file(temp_storage_path):
         storage.load()
 
 
-def test_local_storage_atomic_write(temp_storage_path):
+def test_local_storage_save_chunks(temp_storage_path, open_storage):
+    """Test that pieces are written as one snapshot and clear the journal."""
+    storage = open_storage(temp_storage_path)
+    storage.save_op({"op": "create", "id": 1, "label": "root", "parent_id": None})
+    
+    storage.save_chunks([b'{"labels":[', bytearray(b'null,"root"'), b'],"parents":[-2,-1],"next_id":2}'])
+    
+    assert storage.load() == {"labels": [None, "root"], "parents": [-2, -1], "next_id": 2}
+    assert not storage.needs_compaction()
+
+
+def test_local_storage_zstd(tmp_path, open_storage):
+    """Test that a .zst snapshot is compressed and loads back."""
+    path = tmp_path / "trees.json.zst"
+    storage = open_storage(path)
+    test_data = {"labels": [None] + ["node"] * 1000, "parents": [-2] + [-1] * 1000, "next_id": 1001}
+    
+    storage.save_chunks([orjson.dumps(test_data)])
+    
+    raw = path.read_bytes()
+    assert raw.startswith(LocalFileStorage.ZSTD_MAGIC)
+    assert len(raw) < len(orjson.dumps(test_data)) // 10
+    assert storage.load() == test_data
+    
+    # Compaction thresholds use the uncompressed size, also after a restart
+    assert storage._snapshot_bytes == len(orjson.dumps(test_data))
+    reopened = open_storage(path)
+    reopened.load()
+    assert reopened._snapshot_bytes == len(orjson.dumps(test_data))
+    
+    # A truncated frame is reported as corruption
+    path.write_bytes(raw[:20])
+    with pytest.raises(StorageError, match="Corrupted data file"):
+        storage.load()
+
+
+def test_local_storage_large_snapshot(temp_storage_path, open_storage):
+    """Test loading snapshots large enough to be memory mapped."""
+    storage = open_storage(temp_storage_path)
+    count = LocalFileStorage.MMAP_MIN_BYTES // 4
+    test_data = {"labels": [None] + ["node"] * count, "parents": [-2] + [-1] * count, "next_id": count + 1}
+    storage.save(test_data)
+    assert temp_storage_path.stat().st_size >= LocalFileStorage.MMAP_MIN_BYTES
+    
+    assert storage.load() == test_data
+    
+    # Corruption is still reported as such
+    temp_storage_path.write_bytes(b"{" * LocalFileStorage.MMAP_MIN_BYTES)
+    with pytest.raises(StorageError, match="Corrupted data file"):
+        storage.load()
+
+
+def test_local_storage_atomic_write(temp_storage_path, open_storage):
     """Test that writes are atomic (temp file + rename)."""
-    storage = LocalFileStorage(str(temp_storage_path))
+    storage = open_storage(temp_storage_path)
     
     test_data = {"trees": [], "next_id": 1}
     storage.save(test_data)
@@ -60,16 +115,31 @@ def test_local_storage_atomic_write(temp_storage_path):
     assert temp_storage_path.exists()
 
 
-def test_local_storage_health_check(temp_storage_path):
+@pytest.mark.parametrize("use_tmpfile", [True, False])
+def test_local_storage_leaves_no_temp_files(temp_storage_path, use_tmpfile, open_storage):
+    """Test that only the snapshot and journal remain, with or without O_TMPFILE."""
+    storage = open_storage(temp_storage_path)
+    storage._use_tmpfile = storage._use_tmpfile and use_tmpfile
+    
+    for next_id in range(1, 4):
+        storage.save({"trees": [], "next_id": next_id})
+    
+    assert sorted(p.name for p in temp_storage_path.parent.iterdir()) == sorted([
+        temp_storage_path.name, temp_storage_path.with_suffix('.jsonl').name
+    ])
+    assert storage.load()["next_id"] == 3
+
+
+def test_local_storage_health_check(temp_storage_path, open_storage):
     """Test health check for local storage."""
-    storage = LocalFileStorage(str(temp_storage_path))
+    storage = open_storage(temp_storage_path)
     assert storage.health_check() is True
 
 
-def test_local_storage_creates_directory(tmp_path):
+def test_local_storage_creates_directory(tmp_path, open_storage):
     """Test that storage creates parent directories if needed."""
     nested_path = tmp_path / "nested" / "dir" / "trees.json"
-    storage = LocalFileStorage(str(nested_path))
+    storage = open_storage(nested_path)
     
     test_data = {"trees": [], "next_id": 1}
     storage.save(test_data)
@@ -77,3 +147,184 @@ def test_local_storage_creates_directory(tmp_path):
     assert nested_path.exists()
     assert nested_path.parent.exists()
 
+
+def test_local_storage_journal_replay(temp_storage_path, open_storage):
+    """Test that journaled ops are returned alongside the snapshot."""
+    storage = open_storage(temp_storage_path)
+    storage.save({"trees": [{"id": 1, "label": "root", "children": []}], "next_id": 2})
+    
+    op = {"op": "create", "id": 2, "label": "child", "parent_id": 1}
+    assert storage.save_op(op) is True
+    
+    loaded_data = open_storage(temp_storage_path).load()
+    assert loaded_data["next_id"] == 2
+    assert loaded_data["journal"] == [op]
+
+
+def test_local_storage_journal_short_writes(temp_storage_path, open_storage):
+    """Test that short and failed journal writes never leave a partial line."""
+    storage = open_storage(temp_storage_path)
+    journal = storage._journal
+    
+    class ShortWrites:
+        fail = False
+        
+        def write(self, data):
+            if self.fail:
+                journal.write(bytes(data[:5]))
+                raise OSError(28, "No space left on device")
+            return journal.write(bytes(data[:3]))
+        
+        def __getattr__(self, name):
+            return getattr(journal, name)
+    
+    storage._journal = ShortWrites()
+    first = {"op": "create", "id": 1, "label": "root", "parent_id": None}
+    storage.save_op(first)
+    
+    storage._journal.fail = True
+    with pytest.raises(StorageError):
+        storage.save_op({"op": "create", "id": 2, "label": "lost", "parent_id": 1})
+    storage._journal.fail = False
+    
+    second = {"op": "create", "id": 3, "label": "child", "parent_id": 1}
+    storage.save_op(second)
+    assert storage.load()["journal"] == [first, second]
+
+
+def test_local_storage_save_compacts_journal(temp_storage_path, open_storage):
+    """Test that save drops journaled ops covered by the snapshot."""
+    storage = open_storage(temp_storage_path)
+    covered = {"op": "create", "id": 1, "label": "root", "parent_id": None}
+    pending = {"op": "create", "id": 2, "label": "child", "parent_id": 1}
+    storage.save_op(covered)
+    storage.save_op(pending)
+    
+    storage.save({"trees": [{"id": 1, "label": "root", "children": []}], "next_id": 2})
+    
+    assert storage.load()["journal"] == [pending]
+    assert not storage.needs_compaction()
+    
+    # A journal over half the snapshot size is compacted on startup
+    assert storage.needs_compaction(startup=True)
+
+
+def test_local_storage_compact_by_default(temp_storage_path, monkeypatch, open_storage):
+    """Test that snapshots are compact unless PRETTY_JSON indentation is enabled."""
+    if temp_storage_path.suffix != ".json":
+        pytest.skip("Indentation only applies to JSON snapshots")
+    storage = open_storage(temp_storage_path)
+    test_data = {"trees": [{"id": 1, "label": "root", "children": []}], "next_id": 2}
+    
+    storage.save(test_data)
+    assert b"\n" not in temp_storage_path.read_bytes()
+    
+    monkeypatch.setattr(storage_module, "SNAPSHOT_DUMPS_OPTION", orjson.OPT_INDENT_2)
+    storage.save(test_data)
+    assert b"\n" in temp_storage_path.read_bytes()
+    assert storage.load() == test_data
+
+
+def test_local_storage_save_chunks_keeps_later_ops(temp_storage_path, open_storage):
+    """Test that ops journaled after the state was captured survive the save."""
+    storage = open_storage(temp_storage_path)
+    covered = {"op": "create", "id": 1, "label": "root", "parent_id": None}
+    later = {"op": "create", "id": 2, "label": "child", "parent_id": 1}
+    storage.save_op(covered)
+    storage.save_op(later)
+    
+    storage.save_chunks([b'{"labels":[null,"root"],"parents":[-2,-1],"next_id":2}'], next_id=2)
+    
+    assert storage.load()["journal"] == [later]
+
+
+def test_local_storage_interrupted_compaction_keeps_journal(temp_storage_path, open_storage, monkeypatch):
+    """Test that a compaction failing before its rename loses no journaled op."""
+    storage = open_storage(temp_storage_path)
+    first = {"op": "create", "id": 1, "label": "root", "parent_id": None}
+    storage.save_op(first)
+    
+    real_replace = storage_module.os.replace
+    
+    def failing_journal_replace(src, dst):
+        if dst.endswith(".jsonl"):
+            raise OSError(5, "Input/output error")
+        real_replace(src, dst)
+    
+    monkeypatch.setattr(storage_module.os, "replace", failing_journal_replace)
+    with pytest.raises(StorageError):
+        storage.save_chunks([b'{"labels":[null,"root"],"parents":[-2,-1],"next_id":2}'], next_id=2)
+    monkeypatch.undo()
+    
+    # The old journal is intact and still accepts appends
+    second = {"op": "create", "id": 2, "label": "child", "parent_id": 1}
+    storage.save_op(second)
+    assert storage.load()["journal"] == [first, second]
+
+
+def test_local_storage_skips_directory_fsync_on_windows(temp_storage_path, open_storage, monkeypatch):
+    """Test that saves work where directories cannot be opened."""
+    storage = open_storage(temp_storage_path)
+    # As on Windows: no O_TMPFILE, and directories cannot be opened
+    storage._use_tmpfile = False
+    storage._fsync_dirs = False
+    real_open = storage_module.os.open
+    
+    def windows_open(path, flags, *args, **kwargs):
+        if path == str(temp_storage_path.parent):
+            raise PermissionError(13, "Permission denied")
+        return real_open(path, flags, *args, **kwargs)
+    
+    monkeypatch.setattr(storage_module.os, "open", windows_open)
+    storage.save_op({"op": "create", "id": 1, "label": "root", "parent_id": None})
+    storage.save({"labels": [None, "root"], "parents": [-2, -1], "next_id": 2})
+    monkeypatch.undo()
+    
+    assert storage.load() == {"labels": [None, "root"], "parents": [-2, -1], "next_id": 2}
+
+
+def test_local_storage_save_bytes_clears_journal(temp_storage_path, open_storage):
+    """Test saving a pre-serialized snapshot."""
+    storage = open_storage(temp_storage_path)
+    storage.save_op({"op": "create", "id": 1, "label": "root", "parent_id": None})
+    
+    storage.save_bytes(b'{"trees":[{"id":1,"label":"root","children":[]}],"next_id":2}')
+    
+    assert storage.load() == {"trees": [{"id": 1, "label": "root", "children": []}], "next_id": 2}
+
+
+def test_gcs_storage_conflicting_write(monkeypatch):
+    """Test that a GCS upload rejected by its generation precondition raises StorageError."""
+    from google.api_core.exceptions import PreconditionFailed
+    client = MagicMock()
+    blob = client.bucket.return_value.blob.return_value
+    blob.generation = 7
+    blob.download_as_bytes.return_value = b'{"trees": [], "next_id": 1}'
+    monkeypatch.setattr(storage_module, "_get_gcs_client", lambda: client)
+    
+    storage = GCSStorage("bucket")
+    storage.load()
+    blob.upload_from_string.side_effect = PreconditionFailed("generation mismatch")
+    
+    with pytest.raises(StorageError, match="modified by another writer"):
+        storage.save({"trees": [], "next_id": 1})
+    assert blob.upload_from_string.call_args.kwargs["if_generation_match"] == 7
+    
+    # The conflict is terminal: no more uploads, unhealthy, not writable
+    with pytest.raises(StorageError, match="modified by another writer"):
+        storage.save({"trees": [], "next_id": 1})
+    assert blob.upload_from_string.call_count == 1
+    assert storage.health_check() is False
+    assert storage.is_writable() is False
+
+
+def test_s3_storage_health_check_is_cached(monkeypatch):
+    """Test that a successful S3 health check is reused within the TTL."""
+    session = MagicMock()
+    monkeypatch.setattr(storage_module, "_get_boto3_session", lambda: session)
+    s3_client = session.client.return_value
+    
+    storage = S3Storage("bucket")
+    assert storage.health_check() is True
+    assert storage.health_check() is True
+    assert s3_client.head_bucket.call_count == 1
@@ -1,8 +1,8 @@
 """Tests for TreeManager class."""
 
+import orjson
 import pytest
 from app.tree_manager import TreeManager
-from app.models import TreeNode
 
 
 def test_create_root_node():
@@ -10,9 +10,9 @@ def test_create_root_node():
     manager = TreeManager()
     node = manager.create_node("root")
     
-    assert node.id == 1
-    assert node.label == "root"
-    assert len(node.children) == 0
+    assert node["id"] == 1
+    assert node["label"] == "root"
+    assert len(node["children"]) == 0
     assert len(manager.get_all_trees()) == 1
 
 
@@ -20,12 +20,14 @@ def test_create_child_node():
     """Test creating a child node."""
     manager = TreeManager()
     root = manager.create_node("root")
-    child = manager.create_node("child", parent_id=root.id)
+    child = manager.create_node("child", parent_id=root["id"])
     
-    assert child.id == 2
-    assert child.label == "child"
-    assert len(root.children) == 1
-    assert root.children[0].id == child.id
+    assert child["id"] == 2
+    assert child["label"] == "child"
+    
+    tree = manager.get_all_trees()[0]
+    assert len(tree["children"]) == 1
+    assert tree["children"][0]["id"] == child["id"]
 
 
 def test_create_multiple_roots():
@@ -36,20 +38,21 @@ def test_create_multiple_roots():
     
     trees = manager.get_all_trees()
     assert len(trees) == 2
-    assert trees[0].id == root1.id
-    assert trees[1].id == root2.id
+    assert trees[0]["id"] == root1["id"]
+    assert trees[1]["id"] == root2["id"]
 
 
 def test_create_nested_children():
     """Test creating nested child nodes."""
     manager = TreeManager()
     root = manager.create_node("root")
-    child1 = manager.create_node("child1", parent_id=root.id)
-    child2 = manager.create_node("child2", parent_id=child1.id)
+    child1 = manager.create_node("child1", parent_id=root["id"])
+    child2 = manager.create_node("child2", parent_id=child1["id"])
     
-    assert len(root.children) == 1
-    assert len(root.children[0].children) == 1
-    assert root.children[0].children[0].id == child2.id
+    tree = manager.get_all_trees()[0]
+    assert len(tree["children"]) == 1
+    assert len(tree["children"][0]["children"]) == 1
+    assert tree["children"][0]["children"][0]["id"] == child2["id"]
 
 
 def test_parent_not_found():
@@ -58,6 +61,9 @@ def test_parent_not_found():
     
     with pytest.raises(ValueError, match="Parent node with id 999 not found"):
         manager.create_node("orphan", parent_id=999)
+    
+    # The failed create must not consume an id
+    assert manager.create_node("root")["id"] == 1
 
 
 def test_load_and_get_state():
@@ -69,7 +75,7 @@ def test_load_and_get_state():
     # Get state
     state = manager.get_state()
     assert state["next_id"] == 3
-    assert len(state["trees"]) == 1
+    assert state["parents"][1:] == [-1, 1]
     
     # Load into new manager
     new_manager = TreeManager()
@@ -77,7 +83,7 @@ def test_load_and_get_state():
     
     assert new_manager.next_id == 3
     assert len(new_manager.get_all_trees()) == 1
-    assert len(new_manager.get_all_trees()[0].children) == 1
+    assert len(new_manager.get_all_trees()[0]["children"]) == 1
 
 
 def test_load_invalid_state():
@@ -94,7 +100,289 @@ def test_incremental_ids():
     
     for i in range(1, 6):
         node = manager.create_node(f"node{i}")
-        assert node.id == i
+        assert node["id"] == i
     
     assert manager.next_id == 6
 
+
+def test_load_state_replays_journal():
+    """Test that journaled ops are replayed on top of the snapshot."""
+    manager = TreeManager()
+    manager.load_state({
+        "trees": [{"id": 1, "label": "root", "children": []}],
+        "next_id": 2,
+        "journal": [
+            {"op": "create", "id": 1, "label": "root", "parent_id": None},
+            {"op": "create", "id": 2, "label": "child", "parent_id": 1},
+        ]
+    })
+    
+    assert manager.next_id == 3
+    assert len(manager.get_all_trees()) == 1
+    assert manager.get_all_trees()[0]["children"][0]["label"] == "child"
+
+
+def test_get_state_tracks_creates_after_load():
+    """Test that the state mirror stays in sync with creates after a load."""
+    manager = TreeManager()
+    manager.load_state({
+        "trees": [{"id": 1, "label": "root", "children": [{"id": 2, "label": "child", "children": []}]}],
+        "next_id": 3
+    })
+    manager.create_node("grandchild", parent_id=2)
+    manager.create_node("root2")
+    
+    assert manager.get_state() == {
+        "labels": [None, "root", "child", "grandchild", "root2"],
+        "parents": [-2, -1, 1, 2, -1],
+        "next_id": 5
+    }
+
+
+def test_load_legacy_and_flat_state_agree():
+    """Test that nested trees from older versions load like the flat arrays."""
+    legacy = TreeManager()
+    legacy.load_state({
+        "trees": [{"id": 1, "label": "root", "children": [{"id": 3, "label": "child", "children": []}]}],
+        "next_id": 4
+    })
+    
+    flat = TreeManager()
+    flat.load_state(legacy.get_state())
+    
+    assert flat.get_state() == legacy.get_state()
+    assert flat.get_all_trees() == legacy.get_all_trees()
+    assert flat.children_of(1) == [3]
+    
+    # Id 2 was never created
+    with pytest.raises(ValueError, match="Node with id 2 not found"):
+        flat.children_of(2)
+
+
+def test_load_flat_state_rejects_bad_parent():
+    """Test that a parent id that is not an earlier node is rejected."""
+    manager = TreeManager()
+    
+    with pytest.raises(ValueError, match="Invalid tree data format"):
+        manager.load_state({"labels": [None, "a", "b"], "parents": [-2, 2, -1], "next_id": 3})
+
+
+def test_create_nodes_is_atomic():
+    """Test that a batch with a missing parent leaves the state untouched."""
+    manager = TreeManager()
+    manager.create_node("root")
+    
+    with pytest.raises(ValueError, match="Parent node with id 3 not found"):
+        manager.create_nodes([("child", 1), ("orphan", 3)])
+    
+    assert manager.next_id == 2
+    assert manager.get_all_trees()[0]["children"] == []
+
+
+def test_get_state_bytes_cache():
+    """Test that serialized state matches get_state and is refreshed on create."""
+    manager = TreeManager()
+    manager.create_node("root")
+    assert orjson.loads(manager.get_state_bytes()) == manager.get_state()
+    
+    cached = manager.get_trees_bytes()
+    assert manager.get_trees_bytes() is cached
+    
+    manager.create_node("child", parent_id=1)
+    assert orjson.loads(manager.get_state_bytes()) == manager.get_state()
+    
+    # Loading replaces the arrays, including ids skipped by the journal
+    manager.load_state({
+        "labels": [None, "root"],
+        "parents": [-2, -1],
+        "next_id": 2,
+        "journal": [{"op": "create", "id": 3, "label": "late", "parent_id": 1}]
+    })
+    assert orjson.loads(manager.get_state_bytes()) == manager.get_state()
+    assert manager.get_state()["parents"] == [-2, -1, -2, 1]
+
+
+def test_labels_are_interned():
+    """Test that equal labels share a single string object."""
+    manager = TreeManager()
+    manager.load_state({
+        "trees": [
+            {"id": 1, "label": "".join(["ca", "t"]), "children": []},
+            {"id": 2, "label": "".join(["c", "at"]), "children": []}
+        ],
+        "next_id": 3
+    })
+    node = manager.create_node("".join(["c", "a", "t"]))
+    
+    first, second = manager.get_all_trees()[:2]
+    assert first["label"] is second["label"] is node["label"]
+
+
+def test_load_state_rejects_duplicate_ids():
+    """Test that a node id appearing twice is rejected on load."""
+    manager = TreeManager()
+    data = {
+        "trees": [
+            {"id": 1, "label": "a", "children": [{"id": 1, "label": "b", "children": []}]}
+        ],
+        "next_id": 2
+    }
+    
+    with pytest.raises(ValueError, match="Invalid tree data format"):
+        manager.load_state(data)
+
+
+def test_deep_chain():
+    """Test that a chain deeper than the recursion limit loads and serializes."""
+    depth = 10000
+    manager = TreeManager()
+    manager.create_node("node")
+    for parent_id in range(1, depth):
+        manager.create_node("node", parent_id=parent_id)
+    
+    body = manager.get_trees_bytes()
+    assert body.count(b'"children":[') == depth
+    assert body.endswith(b"[" + b"]}" * depth + b"]")
+    
+    new_manager = TreeManager()
+    new_manager.load_state(orjson.loads(manager.get_state_bytes()))
+    assert new_manager.get_trees_bytes() == body
+    
+    node = new_manager.get_all_trees()[0]
+    for _ in range(depth - 1):
+        node = node["children"][0]
+    assert node["id"] == depth
+
+
+def test_dump_trees_matches_orjson():
+    """Test that the unlimited-depth encoder matches orjson's output."""
+    manager = TreeManager()
+    manager.create_node("root")
+    manager.create_node("child", parent_id=1)
+    manager.create_node('quoted "label"', parent_id=1)
+    manager.create_node("grandchild", parent_id=2)
+    manager.create_node("root2")
+    
+    assert manager._dump_trees() == orjson.dumps(manager.get_all_trees())
+
+
+def test_create_nodes_matches_single_creates():
+    """Test that a bulk create builds the same state as one create per node."""
+    specs = [("root", None)] + [(f"node{i % 10}", i // 2 or None) for i in range(2, 10001)]
+    
+    single = TreeManager()
+    for label, parent_id in specs:
+        single.create_node(label, parent_id)
+    
+    bulk = TreeManager()
+    nodes = bulk.create_nodes(specs)
+    
+    assert [node["id"] for node in nodes] == list(range(1, 10001))
+    assert bulk.next_id == single.next_id == 10001
+    assert bulk.get_state() == single.get_state()
+    assert bulk.get_trees_bytes() == single.get_trees_bytes()
+
+
+def test_create_nodes_reports_all_missing_parents():
+    """Test that every missing parent is listed in the error."""
+    manager = TreeManager()
+    
+    with pytest.raises(ValueError, match="Parent nodes with ids 5, 9 not found"):
+        manager.create_nodes([("root", None), ("a", 5), ("b", 1), ("c", 9)])
+    
+    assert manager.next_id == 1
+
+
+def test_large_state_uses_vocab():
+    """Test that large states store each distinct label once and round-trip."""
+    manager = TreeManager()
+    manager.create_nodes([("root", None)] + [(f"label{i % 3}", 1) for i in range(150)])
+    first = manager.get_state_bytes()
+    manager.create_nodes([("label0", 1), ("new", 2)])
+    
+    state = manager.get_state()
+    assert state["vocab"] == ["root", "label0", "label1", "label2", "new"]
+    assert state["label_ids"][:4] == [-1, 0, 1, 2]
+    assert orjson.loads(manager.get_state_bytes()) == state
+    assert len(first) < len(orjson.dumps({"labels": manager._labels[:152], "parents": manager._parents[:152]}))
+    
+    loaded = TreeManager()
+    loaded.load_state(state)
+    assert loaded.get_all_trees() == manager.get_all_trees()
+    assert loaded.get_state() == state
+
+
+def test_load_legacy_state_orders_siblings_by_id():
+    """Test that legacy siblings are put in creation order and ids are checked."""
+    manager = TreeManager()
+    manager.load_state({
+        "trees": [
+            {"id": 4, "label": "b", "children": []},
+            {"id": 1, "label": "a", "children": [
+                {"id": 3, "label": "y", "children": []},
+                {"id": 2, "label": "x", "children": []}
+            ]}
+        ],
+        "next_id": 5
+    })
+    
+    trees = manager.get_all_trees()
+    assert [tree["id"] for tree in trees] == [1, 4]
+    assert [child["id"] for child in trees[0]["children"]] == [2, 3]
+    assert manager._dump_trees() == manager.get_trees_bytes()
+    
+    with pytest.raises(ValueError, match="Invalid tree data format"):
+        manager.load_state({
+            "trees": [{"id": 2, "label": "a", "children": [{"id": 1, "label": "b", "children": []}]}],
+            "next_id": 3
+        })
+
+
+def test_load_state_adopts_flat_arrays():
+    """Test that loaded flat arrays are used in place and get_state copies them."""
+    parents = [-2, -1, 1]
+    manager = TreeManager()
+    manager.load_state({"labels": [None, "root", "child"], "parents": parents, "next_id": 3})
+    
+    assert manager._parents is parents
+    state = manager.get_state()
+    assert state["parents"] == parents and state["parents"] is not parents
+
+
+def test_child_index_overflow_and_reindex():
+    """Test that children created after a load are found before and after a reindex."""
+    manager = TreeManager()
+    manager.load_state({"labels": [None, "root", "a", "b"], "parents": [-2, -1, 1, 1], "next_id": 4})
+    
+    manager.create_node("c", parent_id=1)
+    manager.create_node("d", parent_id=2)
+    assert manager._extra_children == {1: [4], 2: [5]}
+    assert manager.children_of(1) == [2, 3, 4]
+    
+    # Growing past twice the indexed ids folds the overflow into the index
+    manager.create_nodes([("e", 1), ("f", 6), ("g", None)])
+    assert manager._extra_children == {}
+    assert manager.children_of(1) == [2, 3, 4, 6]
+    assert manager.children_of(6) == [7]
+    assert manager._dump_trees() == manager.get_trees_bytes()
+
+
+def test_discard_nodes_undoes_creates():
+    """Test that discarded creates leave the same state as never creating them."""
+    manager = TreeManager()
+    manager.load_state({"labels": [None, "root", "a", "b"], "parents": [-2, -1, 1, 1], "next_id": 4})
+    expected = manager.get_trees_bytes()
+    version = manager.version
+    
+    # Both from the overflow and after a reindex
+    manager.create_nodes([("c", 1), ("d", None)])
+    manager.discard_nodes(4)
+    manager.create_nodes([("c", 1), ("d", 4), ("e", None), ("f", 5), ("g", 6)])
+    assert manager._indexed == manager.next_id
+    manager.discard_nodes(4)
+    
+    assert manager.next_id == 4
+    assert manager.version > version
+    assert manager.get_trees_bytes() == expected
+    assert manager.create_node("again", parent_id=3)["id"] == 4
+    assert manager.children_of(3) == [4]